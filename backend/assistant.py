@@ -1,10 +1,17 @@
+import copy
 from typing import Optional
 from config import MSG
 from models import Session, Mode, Intent, LearnSt, QuizSt
 from services import gemini, tts
 from session import sessions
+from scheduler import current_sid
+from resilience import Degraded, note
+import recorder
 from prompts import teach_prompt, quiz_prompt, qa_prompt, simplify_prompt, example_prompt
 
+# Session fields a handler may touch before its Gemini call; restored if that call degrades.
+ROLLBACK = ("mode", "topic", "topics", "learn_st", "quiz_st", "quiz_log", "profile", "last_resp")
+
 class Assistant:
     def __init__(self):
         self.gemini = gemini
@@ -15,6 +22,7 @@ class Assistant:
 
     async def process(self, text: str, s: Session) -> str:
         lang = s.lang.value
+        current_sid.set(s.sid)
         
         if s.mode == Mode.QUIZ and s.quiz_st:
             intent, topic, _ = await self.gemini.detect_intent(text, lang)
@@ -23,9 +31,20 @@ class Assistant:
         else:
             intent, topic, _ = await self.gemini.detect_intent(text, lang)
 
+        recorder.note("intent", intent.value)
         sessions.add_msg(s, "user", text, intent.value)
-        resp = await self._handle(intent, topic, text, s)
-        sessions.add_msg(s, "assistant", resp, intent.value)
+        snap = {k: copy.deepcopy(getattr(s, k)) for k in ROLLBACK}
+        try:
+            resp = await self._handle(intent, topic, text, s)
+            sessions.add_msg(s, "assistant", resp, intent.value)
+        except Degraded:
+            note("templated")
+            for k, v in snap.items():
+                setattr(s, k, v)
+            resp = self.msg("busy", s)
+            # Logged, but not kept as last_resp so repeat/simplify skip it.
+            sessions.add_msg(s, "assistant", resp, intent.value)
+            s.last_resp = snap["last_resp"]
         sessions.save(s)
         return resp
 
@@ -55,18 +74,19 @@ class Assistant:
         s.topic = topic
         s.learn_st = LearnSt(topic=topic, sec=1)
         
-        prompt = teach_prompt(topic, 1, [], s.lang.value, s.profile.to_dict())
-        return await self.gemini.gen(prompt)
+        prompt = teach_prompt(topic, 1, [], s.lang.value, s.profile.to_dict(), s.history)
+        return await self.gemini.gen(prompt, "teach", key=self._key(s, "teach", topic, 1))
 
     async def _quiz(self, topic, text, s: Session) -> str:
         if not s.topics:
             return self.msg("no_topics", s)
         
         s.mode = Mode.QUIZ
+        self._log_quiz(s)
         s.quiz_st = QuizSt(num=1)
         
-        prompt = quiz_prompt(s.topics, 1, 0, 0, [], "generate", "", s.lang.value, s.profile.to_dict())
-        resp = await self.gemini.gen(prompt)
+        prompt = quiz_prompt(s.topics, 1, 0, 0, s.quiz_log, "generate", "", s.lang.value, s.profile.to_dict())
+        resp = await self.gemini.gen(prompt, "quiz_gen", key=self._key(s, "quiz_gen", *s.topics[-3:]))
         s.quiz_st.q = resp
         return resp
 
@@ -77,7 +97,7 @@ class Assistant:
         qa = s.quiz_st.history + [{"question": s.quiz_st.q}]
         prompt = quiz_prompt(s.topics, s.quiz_st.num, s.quiz_st.score, s.quiz_st.total, 
                             qa, "evaluate", text, s.lang.value, s.profile.to_dict())
-        resp = await self.gemini.gen(prompt)
+        resp = await self.gemini.gen(prompt, "quiz_eval")
         
         correct = self._check_correct(resp)
         if correct:
@@ -91,6 +111,15 @@ class Assistant:
         s.quiz_st.q = resp
         return resp
 
+    def _key(self, s: Session, kind: str, *parts) -> str:
+        # Stable cache key for the degraded fallback; prompts differ per conversation.
+        return "|".join([kind, s.lang.value, *map(str, parts)])
+
+    def _log_quiz(self, s: Session):
+        # Keep answered questions across quizzes so the next one can target misses.
+        if s.quiz_st and s.quiz_st.history:
+            s.quiz_log = (s.quiz_log + s.quiz_st.history)[-20:]
+
     def _check_correct(self, resp: str) -> bool:
         r = resp.lower()
         pos = ["correct", "right", "excellent", "good", "yes", "exactly", "perfect",
@@ -104,8 +133,8 @@ class Assistant:
         if topic and topic not in s.topics:
             s.topics.append(topic)
             s.topic = topic
-        prompt = qa_prompt(text, s.lang.value)
-        return await self.gemini.gen(prompt)
+        prompt = qa_prompt(text, s.lang.value, s.history[:-1])
+        return await self.gemini.gen(prompt, "qa", key=self._key(s, "qa", text.lower().strip()))
 
     async def _repeat(self, topic, text, s: Session) -> str:
         return s.last_resp if s.last_resp else self.msg("no_prev", s)
@@ -121,8 +150,8 @@ class Assistant:
             s.learn_st.covered.pop()
         
         prompt = teach_prompt(s.learn_st.topic, s.learn_st.sec, s.learn_st.covered, 
-                             s.lang.value, s.profile.to_dict())
-        return await self.gemini.gen(prompt)
+                             s.lang.value, s.profile.to_dict(), s.history)
+        return await self.gemini.gen(prompt, "teach", key=self._key(s, "teach", s.learn_st.topic, s.learn_st.sec))
 
     async def _stop(self, topic, text, s: Session) -> str:
         prev = s.mode
@@ -133,6 +162,7 @@ class Assistant:
         
         if prev == Mode.QUIZ and s.quiz_st:
             sc, tot = s.quiz_st.score, s.quiz_st.total
+            self._log_quiz(s)
             s.quiz_st = None
             return self.msg("quiz_stop", s, score=sc, total=tot)
         
@@ -152,7 +182,7 @@ class Assistant:
         ctx = s.last_resp[:500] if s.last_resp else ""
         s.profile.example_cnt += 1
         prompt = example_prompt(t, ctx, s.lang.value)
-        return await self.gemini.gen(prompt)
+        return await self.gemini.gen(prompt, "example", key=self._key(s, "example", t))
 
     async def _simplify(self, topic, text, s: Session) -> str:
         if not s.last_resp:
@@ -161,7 +191,7 @@ class Assistant:
         if s.profile.simplify_cnt >= 3:
             s.profile.pace = "slow"
         prompt = simplify_prompt(s.last_resp, s.lang.value)
-        return await self.gemini.gen(prompt)
+        return await self.gemini.gen(prompt, "simplify")
 
     async def _continue(self, topic, text, s: Session) -> str:
         if s.mode != Mode.LEARN or not s.learn_st:
@@ -180,14 +210,14 @@ class Assistant:
             return self.msg("done", s, topic=done)
         
         prompt = teach_prompt(s.learn_st.topic, s.learn_st.sec, s.learn_st.covered,
-                             s.lang.value, s.profile.to_dict())
-        return await self.gemini.gen(prompt)
+                             s.lang.value, s.profile.to_dict(), s.history)
+        return await self.gemini.gen(prompt, "teach", key=self._key(s, "teach", s.learn_st.topic, s.learn_st.sec))
 
     async def _unknown(self, topic, text, s: Session) -> str:
         if topic and topic not in s.topics:
             s.topics.append(topic)
             s.topic = topic
-        prompt = qa_prompt(text, s.lang.value)
-        return await self.gemini.gen(prompt)
+        prompt = qa_prompt(text, s.lang.value, s.history[:-1])
+        return await self.gemini.gen(prompt, "qa", key=self._key(s, "qa", text.lower().strip()))
 
 assistant = Assistant()
\ No newline at end of file
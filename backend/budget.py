@@ -0,0 +1,107 @@
+import re
+from collections import defaultdict, deque
+
+from config import PROMPT_BUDGET
+
+_TOK = re.compile(r"\w+|[^\w\s]")
+
+# Approximate subword tokens: one per ~4 characters of each word or symbol.
+# Long agglutinative AZ words cost several tokens, as they do for the model.
+def _cost(piece: str) -> int:
+    return (len(piece) + 3) // 4
+
+def count(text: str) -> int:
+    return sum(_cost(m) for m in _TOK.findall(text or ""))
+
+def clip(text: str, limit: int) -> str:
+    if limit <= 0:
+        return ""
+    used = 0
+    for m in _TOK.finditer(text or ""):
+        used += _cost(m.group())
+        if used > limit:
+            return text[:m.start()].rstrip() + "..."
+    return text or ""
+
+def clip_tail(text: str, limit: int) -> str:
+    if limit <= 0:
+        return ""
+    used = 0
+    for m in reversed(list(_TOK.finditer(text or ""))):
+        used += _cost(m.group())
+        if used > limit:
+            return "..." + text[m.end():].lstrip()
+    return text or ""
+
+def last_question(text: str) -> str:
+    parts = [p for p in re.split(r"(?<=[.!?:])\s+|\n+", text or "") if "?" in p]
+    return parts[-1].strip() if parts else (text or "")
+
+class Budget:
+    """Per-prompt token allowance. Fields are filled in priority order;
+    each call spends from what is left after the fixed template."""
+
+    def __init__(self, kind: str, tpl: str):
+        self.kind = kind
+        self.total = PROMPT_BUDGET[kind]
+        self.left = self.total - count(tpl)
+
+    def _spend(self, text: str) -> str:
+        self.left -= count(text)
+        return text
+
+    def clip(self, text: str, cap: int) -> str:
+        return self._spend(clip(text, min(cap, self.left)))
+
+    def clip_tail(self, text: str, cap: int) -> str:
+        return self._spend(clip_tail(text, min(cap, self.left)))
+
+    def join(self, items: list[str], cap: int, sep: str = ", ") -> str:
+        # Newest entries are most relevant, so fill from the end.
+        cap = min(cap, self.left)
+        kept, used = [], 0
+        for it in reversed(items):
+            n = count(it) + 1
+            if used + n > cap:
+                break
+            kept.append(it)
+            used += n
+        kept.reverse()
+        out = sep.join(kept)
+        if len(kept) < len(items):
+            out = f"(+{len(items) - len(kept)}) {out}".strip()
+        return self._spend(out)
+
+    def turns(self, history: list, cap: int, n: int = 8, per: int = 60) -> str:
+        lines = [f"{'viva' if m.role == 'assistant' else 'user'}: {clip(m.content, per)}"
+                 for m in history[-n:]]
+        return self.join(lines, cap, sep="\n")
+
+    def weak(self, qa: list[dict], cap: int, per: int = 25) -> str:
+        # A stored "question" is the previous reply: feedback first, the question last.
+        missed = list(dict.fromkeys(clip_tail(last_question(x.get("question", "")), per) for x in qa if x.get("correct") is False))
+        return self.join(missed, cap, sep="; ")
+
+class PromptStats:
+    def __init__(self, keep: int = 500):
+        self.data: dict[str, deque] = defaultdict(lambda: deque(maxlen=keep))
+
+    def record(self, kind: str, tokens: int, ms: float):
+        self.data[kind].append((tokens, ms))
+
+    def summary(self) -> dict:
+        out = {}
+        for kind, rows in self.data.items():
+            toks = sorted(r[0] for r in rows)
+            ms = sorted(r[1] for r in rows)
+            out[kind] = {
+                "n": len(rows),
+                "budget": PROMPT_BUDGET.get(kind),
+                "tokens_avg": round(sum(toks) / len(toks), 1),
+                "tokens_max": toks[-1],
+                "latency_p50_ms": round(ms[len(ms) // 2], 1),
+                "latency_p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 1)
+            }
+        return out
+
+prompt_stats = PromptStats()
@@ -21,6 +21,7 @@ MSG = {
         "done": "Done with '{topic}'! Say 'quiz' to test or learn something new.",
         "no_audio": "Couldn't hear you. Try again.",
         "error": "Something went wrong. Try again.",
+        "busy": "I'm a bit slow right now. Give me a moment and try again.",
         "lang_changed": "Switched to English."
     },
     "az": {
@@ -38,6 +39,95 @@ MSG = {
         "done": "'{topic}' bitdi! 'Test' deyin və ya yeni mövzu öyrənin.",
         "no_audio": "Eşidə bilmədim. Yenidən cəhd edin.",
         "error": "Xəta baş verdi. Yenidən cəhd edin.",
+        "busy": "Hazırda bir az yavaşam. Bir azdan yenidən cəhd edin.",
         "lang_changed": "Azərbaycan dilinə keçildi."
     }
-}
\ No newline at end of file
+}
+
+# Keyword fallback for intent detection when Gemini is unavailable; first match wins
+INTENT_WORDS = {
+    "en": [
+        ("simplify", ["don't understand", "dont understand", "simpler", "simplify"]),
+        ("example", ["example"]),
+        ("repeat", ["repeat", "say again", "again"]),
+        ("back", ["go back", "previous", "back"]),
+        ("stop", ["stop", "pause"]),
+        ("slower", ["slower", "slow down"]),
+        ("faster", ["faster", "speed up"]),
+        ("quiz", ["quiz", "test me"]),
+        ("learn", ["teach me", "explain", "learn"]),
+        ("continue", ["continue", "next", "yes", "go on"])
+    ],
+    "az": [
+        ("simplify", ["başa düşmürəm", "sadə"]),
+        ("example", ["nümunə", "misal"]),
+        ("repeat", ["təkrarla", "yenidən"]),
+        ("back", ["geri", "əvvəlki"]),
+        ("stop", ["dayandır", "dayan"]),
+        ("slower", ["yavaş"]),
+        ("faster", ["sürətli", "tez"]),
+        ("quiz", ["test", "sınaq", "yoxla"]),
+        ("learn", ["öyrət", "izah et"]),
+        ("continue", ["davam", "növbəti", "hə", "bəli"])
+    ]
+}
+
+# Per-turn latency budget and circuit breakers on external services
+TURN_BUDGET_S = 12.0
+
+BREAKERS = {
+    "gemini": {"fails": 5, "reset_s": 30.0, "timeout_s": 8.0},
+    "tts": {"fails": 3, "reset_s": 20.0, "timeout_s": 6.0}
+}
+
+# Token budgets per prompt kind (whole prompt). budget.count approximates subword
+# tokens at ~4 characters per word piece; recheck against Gemini's count_tokens when tuning.
+PROMPT_BUDGET = {
+    "intent": 300,
+    "teach": 600,
+    "quiz_gen": 400,
+    "quiz_eval": 600,
+    "qa": 500,
+    "simplify": 800,
+    "example": 450
+}
+
+# LLM scheduler: lane 0 = intent classification, 1 = user-facing generation, 2 = background
+LLM_SCHED = {
+    "concurrency": 8,
+    "per_session": 2,
+    "rpm": 600,
+    "burst": 20,
+    "queue_max": [64, 32, 8],
+    "max_wait": [5.0, 30.0, 3.0]
+}
+
+# Opt-in turn recorder; sampling is per session so replays keep conversation context
+TRACE = {
+    "enabled": False,
+    "sample": 0.05,
+    "dir": "traces",
+    "segment_mb": 32,
+    "keep": 16
+}
+
+# Whisper tiers, all loaded at startup; drop entries to save memory, but keep STT_CTRL["default"].
+# rtf is the starting guess of seconds of CPU per second of audio, refined as clips run.
+STT_TIERS = {
+    "fast": {"model": "base", "compute": "int8", "beam": 1, "vad_ms": 300, "rtf": 0.05},
+    "turbo": {"model": "turbo", "compute": "int8", "beam": 1, "vad_ms": 500, "rtf": 0.15},
+    "accurate": {"model": "large-v3", "compute": "int8", "beam": 5, "vad_ms": 500, "rtf": 0.6}
+}
+
+# Load is "high" at >= high_depth clips in flight and back to normal only at <= low_depth;
+# a state must hold for hold_s before it can change again.
+STT_CTRL = {
+    "default": "turbo",
+    "busy": "fast",
+    "accurate": "accurate",
+    "accurate_langs": ["az"],
+    "high_depth": 4,
+    "low_depth": 1,
+    "hold_s": 10.0,
+    "long_clip_s": 20.0
+}
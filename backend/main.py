@@ -12,12 +12,17 @@ from models import Lang, TextReq, TextResp, SessionInfo
 from services import whisper, gemini, tts
 from session import sessions
 from assistant import assistant
+from budget import prompt_stats
+from scheduler import scheduler
+from resilience import Degraded, start_turn, status
+from recorder import recorder, note, stage
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("starting viva...")
     whisper.init()
     gemini.init()
+    await tts.prerender()
     print("viva ready")
     yield
     print("shutting down")
@@ -30,7 +35,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Session-ID", "X-Transcribed-Text", "X-Response-Text", "X-Mode", "X-Language"],
+    expose_headers=["X-Session-ID", "X-Transcribed-Text", "X-Response-Text", "X-Mode", "X-Language", "X-Audio-Pending", "X-STT-Tier"],
 )
 
 def safe_hdr(text: str, maxlen: int = 0) -> str:
@@ -38,30 +43,56 @@ def safe_hdr(text: str, maxlen: int = 0) -> str:
         text = text[:maxlen] + "..."
     return urllib.parse.quote(text, safe='')
 
+def canned_key(text: str, lang: str) -> Optional[str]:
+    return "busy" if text == MSG[lang]["busy"] else None
+
+async def speak(text: str, lang: str, rate: float, key: str = None) -> tuple[bytes, bool]:
+    if key and (lang, key) in tts.canned:
+        return tts.canned[(lang, key)], False
+    try:
+        with stage("tts"):
+            data = await tts.synth(text, lang, rate)
+        note("tts_bytes", len(data))
+        return data, False
+    except Degraded:
+        note("tts_bytes", 0)
+        return b"", True
+
 @app.post("/process-voice", response_class=Response)
 async def voice(
     audio: UploadFile = File(...),
     session_id: Optional[str] = Form(None),
     language: str = Form("en")
 ):
+    start_turn()
+    t = None
     try:
         s = sessions.get_or_create(session_id, language)
         s.lang = Lang.AZ if language == "az" else Lang.EN
+        t = recorder.begin("voice", s.sid, s.lang.value)
         
         data = await audio.read()
-        text = await whisper.transcribe(data, s.lang.value)
+        if t:
+            t.audio = data
+        with stage("stt"):
+            text, tier = await whisper.transcribe(data, s.lang.value)
+        note("transcript", text)
+        note("stt_tier", tier)
         
         if not text:
             err = MSG[s.lang.value]["no_audio"]
-            audio_resp = await tts.synth(err, s.lang.value, s.rate)
+            audio_resp, pending = await speak(err, s.lang.value, s.rate, "no_audio")
             return Response(
                 content=audio_resp,
                 media_type="audio/mpeg",
-                headers={"X-Session-ID": s.sid, "X-Response-Text": safe_hdr(err), "X-Language": s.lang.value}
+                headers={"X-Session-ID": s.sid, "X-Response-Text": safe_hdr(err), "X-Language": s.lang.value,
+                         "X-Audio-Pending": "1" if pending else "0", "X-STT-Tier": tier}
             )
         
-        resp = await assistant.process(text, s)
-        audio_resp = await tts.synth(resp, s.lang.value, s.rate)
+        with stage("assistant"):
+            resp = await assistant.process(text, s)
+        note("response", resp)
+        audio_resp, pending = await speak(resp, s.lang.value, s.rate, canned_key(resp, s.lang.value))
         
         return Response(
             content=audio_resp,
@@ -71,32 +102,51 @@ async def voice(
                 "X-Transcribed-Text": safe_hdr(text),
                 "X-Response-Text": safe_hdr(resp),
                 "X-Mode": s.mode.value,
-                "X-Language": s.lang.value
+                "X-Language": s.lang.value,
+                "X-Audio-Pending": "1" if pending else "0",
+                "X-STT-Tier": tier
             }
         )
     except Exception as e:
+        note("error", repr(e))
         lang = language if language in ["en", "az"] else "en"
-        try:
-            audio_resp = await tts.synth(MSG[lang]["error"], lang, 1.0)
-            return Response(content=audio_resp, media_type="audio/mpeg")
-        except:
+        audio_resp = tts.canned.get((lang, "error"))
+        if audio_resp is None:
             raise HTTPException(500, str(e))
+        return Response(content=audio_resp, media_type="audio/mpeg",
+                        headers={"X-Response-Text": safe_hdr(MSG[lang]["error"]), "X-Language": lang})
+    finally:
+        recorder.end(t)
 
 @app.post("/process-text", response_model=TextResp)
 async def text(req: TextReq):
     lang = req.lang or "en"
     s = sessions.get_or_create(req.session_id, lang)
     s.lang = Lang.AZ if lang == "az" else Lang.EN
+    start_turn()
+    t = recorder.begin("text", s.sid, s.lang.value)
+    note("transcript", req.text)
+    note("audio", req.audio)
     
-    resp = await assistant.process(req.text, s)
-    intent, _, _ = await gemini.detect_intent(req.text, s.lang.value)
-    
-    audio_b64 = None
-    if req.audio:
-        data = await tts.synth(resp, s.lang.value, s.rate)
-        audio_b64 = base64.b64encode(data).decode()
+    try:
+        with stage("assistant"):
+            resp = await assistant.process(req.text, s)
+        note("response", resp)
+        intent = s.history[-1].intent
+        
+        audio_b64, pending = None, False
+        if req.audio:
+            data, pending = await speak(resp, s.lang.value, s.rate, canned_key(resp, s.lang.value))
+            if not pending:
+                audio_b64 = base64.b64encode(data).decode()
+    except Exception as e:
+        note("error", repr(e))
+        raise
+    finally:
+        recorder.end(t)
     
-    return TextResp(text=resp, audio_b64=audio_b64, sid=s.sid, mode=s.mode.value, intent=intent.value, lang=s.lang.value)
+    return TextResp(text=resp, audio_b64=audio_b64, sid=s.sid, mode=s.mode.value, intent=intent,
+                    lang=s.lang.value, audio_pending=pending)
 
 @app.get("/session/{sid}", response_model=SessionInfo)
 async def get_session(sid: str):
@@ -137,8 +187,12 @@ async def health():
     return {
         "status": "ok",
         "whisper": "ready" if whisper.model else "not loaded",
+        "stt": whisper.ctl.stats(),
         "gemini": "configured",
-        "tts": "edge-tts"
+        "tts": "edge-tts",
+        "prompts": prompt_stats.summary(),
+        "llm": scheduler.stats(),
+        **status()
     }
 
 @app.get("/test-audio", response_class=Response)
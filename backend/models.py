@@ -41,6 +41,7 @@ class TextResp(BaseModel):
     mode: str
     intent: str
     lang: str
+    audio_pending: bool = False
 
 class SessionInfo(BaseModel):
     sid: str
@@ -106,6 +107,7 @@ class Session(BaseModel):
     topic: Optional[str] = None
     learn_st: Optional[LearnSt] = None
     quiz_st: Optional[QuizSt] = None
+    quiz_log: list[dict] = []
     profile: Profile = Field(default_factory=Profile)
     last_resp: str = ""
     rate: float = 1.0
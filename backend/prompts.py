@@ -1,3 +1,5 @@
+from budget import Budget
+
 INTENT_PROMPT = {
     "en": """Classify intent:
 - learn: wants to learn ("teach me", "explain")
@@ -34,74 +36,128 @@ JSON: {{"intent": "<intent>", "topic": "<topic or null>", "confidence": <0-1>}}
 Input: {user_input}"""
 }
 
-def teach_prompt(topic, sec, prev, lang, profile):
-    diff = "beginner" if profile.get("simplify_requests", 0) > 2 else "intermediate"
-    
-    if lang == "az":
-        return f"""Viva - müəllim. Mövzu: {topic}, Bölmə: {sec}
-Əvvəlki: {', '.join(prev) if prev else 'yoxdur'}
-Çətinlik: {diff}
+TEACH_PROMPT = {
+    "en": """Viva - tutor. Topic: {topic}, Section: {sec}
+Previous: {prev}
+Difficulty: {diff}
+{ctx}
+Explain 2-3 key points. Use practical examples.
+End with: "Continue, or should I explain something again?"
 
+Section {sec}:""",
+
+    "az": """Viva - müəllim. Mövzu: {topic}, Bölmə: {sec}
+Əvvəlki: {prev}
+Çətinlik: {diff}
+{ctx}
 2-3 əsas nöqtə izah et. Praktik nümunə ver.
 Sonda: "Davam edək, yoxsa nəyisə yenidən izah edim?"
 
 {sec}-ci bölmə:"""
-    
-    return f"""Viva - tutor. Topic: {topic}, Section: {sec}
-Previous: {', '.join(prev) if prev else 'none'}
-Difficulty: {diff}
-
-Explain 2-3 key points. Use practical examples.
-End with: "Continue, or should I explain something again?"
+}
 
-Section {sec}:"""
+QUIZ_GEN_PROMPT = {
+    "en": """Topics: {topics}
+Q#{num} | Score: {score}/{total} | Difficulty: {diff}
+{weak}
+Generate a clear question:""",
 
-def quiz_prompt(topics, num, score, total, prev_qa, task, answer, lang, profile):
-    acc = score / total if total > 0 else 0.5
-    diff = "easy" if acc < 0.4 else ("hard" if acc > 0.75 else "medium")
-    
-    if lang == "az":
-        if task == "generate":
-            return f"""Mövzular: {', '.join(topics)}
+    "az": """Mövzular: {topics}
 Sual #{num} | Bal: {score}/{total} | Çətinlik: {diff}
-
+{weak}
 Aydın, sadə sual yarat:"""
-        
-        q = prev_qa[-1].get('question', '') if prev_qa else ''
-        return f"""Sual: {q}
-Cavab: "{answer}"
+}
+
+QUIZ_EVAL_PROMPT = {
+    "en": """Question: {q}
+Answer: "{answer}"
+{weak}
+Evaluate. Confirm if correct, gently correct if wrong.
+End: "Another question, or stop?"
+
+Response:""",
 
+    "az": """Sual: {q}
+Cavab: "{answer}"
+{weak}
 Qiymətləndir. Düzgündürsə təsdiq et, səhvdirsə düzəlt.
 Sonda: "Başqa sual, yoxsa dayandıraq?"
 
 Cavab:"""
-    
-    if task == "generate":
-        return f"""Topics: {', '.join(topics)}
-Q#{num} | Score: {score}/{total} | Difficulty: {diff}
+}
 
-Generate a clear question:"""
-    
-    q = prev_qa[-1].get('question', '') if prev_qa else ''
-    return f"""Question: {q}
-Answer: "{answer}"
+QA_PROMPT = {
+    "en": "{ctx}Question: {question}\n\nGive a clear, concise answer:",
+    "az": "{ctx}Sual: {question}\n\nQısa, aydın cavab ver:"
+}
 
-Evaluate. Confirm if correct, gently correct if wrong.
-End: "Another question, or stop?"
+SIMPLIFY_PROMPT = {
+    "en": "Explain this simply:\n\n{text}\n\nSimpler:",
+    "az": "Bunu sadə izah et:\n\n{text}\n\nSadə:"
+}
 
-Response:"""
+EXAMPLE_PROMPT = {
+    "en": 'Give 2-3 practical examples for "{topic}":\n{ctx}\nExamples:',
+    "az": '"{topic}" üçün 2-3 praktik nümunə:\n{ctx}\nNümunələr:'
+}
 
-def qa_prompt(question, lang):
-    if lang == "az":
-        return f"Sual: {question}\n\nQısa, aydın cavab ver:"
-    return f"Question: {question}\n\nGive a clear, concise answer:"
+LABELS = {
+    "en": {"none": "none", "recent": "Recent conversation:", "weak": "Missed earlier:", "ctx": "Context:"},
+    "az": {"none": "yoxdur", "recent": "Son söhbət:", "weak": "Əvvəl səhv cavablanıb:", "ctx": "Kontekst:"}
+}
+
+def _block(label, body):
+    return f"{label}\n{body}\n" if body else ""
+
+def intent_prompt(text, lang):
+    tpl = INTENT_PROMPT[lang]
+    b = Budget("intent", tpl)
+    return tpl.format(user_input=b.clip(text, b.left))
+
+def teach_prompt(topic, sec, prev, lang, profile, history=None):
+    diff = "beginner" if profile.get("simplify_requests", 0) > 2 else "intermediate"
+    tpl, lb = TEACH_PROMPT[lang], LABELS[lang]
+    b = Budget("teach", tpl)
+    topic = b.clip(topic, 20)
+    ctx = b.turns(history or [], 220)
+    prev = b.join(prev, 40) or lb["none"]
+    return tpl.format(topic=topic, sec=sec, prev=prev, diff=diff, ctx=_block(lb["recent"], ctx))
+
+def quiz_prompt(topics, num, score, total, prev_qa, task, answer, lang, profile):
+    acc = score / total if total > 0 else 0.5
+    diff = "easy" if acc < 0.4 else ("hard" if acc > 0.75 else "medium")
+    lb = LABELS[lang]
+
+    if task == "generate":
+        tpl = QUIZ_GEN_PROMPT[lang]
+        b = Budget("quiz_gen", tpl)
+        weak = b.weak(prev_qa, 100)
+        topics = b.join(topics, 80)
+        return tpl.format(topics=topics, num=num, score=score, total=total, diff=diff,
+                          weak=_block(lb["weak"], weak))
+
+    tpl = QUIZ_EVAL_PROMPT[lang]
+    b = Budget("quiz_eval", tpl)
+    q = b.clip_tail(prev_qa[-1].get('question', '') if prev_qa else '', 150)
+    answer = b.clip(answer, 100)
+    weak = b.weak(prev_qa[:-1], 80)
+    return tpl.format(q=q, answer=answer, weak=_block(lb["weak"], weak))
+
+def qa_prompt(question, lang, history=None):
+    tpl = QA_PROMPT[lang]
+    b = Budget("qa", tpl)
+    question = b.clip(question, 120)
+    ctx = b.turns(history or [], b.left, n=6)
+    return tpl.format(question=question, ctx=_block(LABELS[lang]["recent"], ctx) + ("\n" if ctx else ""))
 
 def simplify_prompt(text, lang):
-    if lang == "az":
-        return f"Bunu sadə izah et:\n\n{text}\n\nSadə:"
-    return f"Explain this simply:\n\n{text}\n\nSimpler:"
+    tpl = SIMPLIFY_PROMPT[lang]
+    b = Budget("simplify", tpl)
+    return tpl.format(text=b.clip(text, b.left))
 
 def example_prompt(topic, ctx, lang):
-    if lang == "az":
-        return f'"{topic}" üçün 2-3 praktik nümunə:\n\nNümunələr:'
-    return f'Give 2-3 practical examples for "{topic}":\n\nExamples:'
\ No newline at end of file
+    tpl = EXAMPLE_PROMPT[lang]
+    b = Budget("example", tpl)
+    topic = b.clip(topic, 20)
+    ctx = b.clip(ctx, 150)
+    return tpl.format(topic=topic, ctx=_block(LABELS[lang]["ctx"], ctx))
@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from config import TRACE
+
+MAGIC = b"VTR1"
+_HDR = struct.Struct("<4sII")  # magic, compressed meta length, audio length
+
+class Turn:
+    def __init__(self, endpoint: str, sid: str, lang: str):
+        self.start = time.perf_counter()
+        self.audio = b""
+        self.meta = {
+            "ts": time.time(), "endpoint": endpoint, "sid": sid, "lang": lang,
+            "calls": [], "stages": {}
+        }
+
+current_turn: ContextVar[Optional[Turn]] = ContextVar("current_turn", default=None)
+
+def note(key: str, value):
+    t = current_turn.get()
+    if t:
+        t.meta[key] = value
+
+def call(kind: str, prompt: str, resp: str, ms: float, cached: bool = False):
+    t = current_turn.get()
+    if t:
+        t.meta["calls"].append({"kind": kind, "prompt": prompt, "resp": resp, "ms": round(ms, 1), "cached": cached})
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t = current_turn.get()
+        if t:
+            t.meta["stages"][name] = round((time.perf_counter() - start) * 1000, 1)
+
+class Recorder:
+    """Appends sampled turns to size-rotated segment files. Each record is
+    a fixed header, zlib-compressed JSON metadata and the raw request audio."""
+
+    def __init__(self, cfg: dict = TRACE, backlog: int = 256):
+        self.cfg = cfg
+        self.fh = None
+        self.sink = None  # synchronous override, used by replay
+        self.q: queue.Queue = queue.Queue(maxsize=backlog)
+        self.thread = None
+        self.dropped = 0
+
+    def sampled(self, sid: str) -> bool:
+        if not self.cfg["enabled"]:
+            return False
+        h = int(hashlib.sha1(sid.encode()).hexdigest()[:8], 16)
+        return h / 0xFFFFFFFF < self.cfg["sample"]
+
+    def begin(self, endpoint: str, sid: str, lang: str) -> Optional[Turn]:
+        t = Turn(endpoint, sid, lang) if self.sampled(sid) else None
+        current_turn.set(t)
+        return t
+
+    def end(self, t: Optional[Turn]):
+        current_turn.set(None)
+        if not t:
+            return
+        t.meta["stages"]["total"] = round((time.perf_counter() - t.start) * 1000, 1)
+        if self.sink:
+            self.sink(t)
+            return
+        # Disk I/O and rotation happen on a writer thread, off the event loop.
+        if not self.thread:
+            self.thread = threading.Thread(target=self._drain, name="trace-writer", daemon=True)
+            self.thread.start()
+        try:
+            self.q.put_nowait(t)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        while True:
+            t = self.q.get()
+            try:
+                self.write(t)
+            except OSError as e:
+                print(f"[trace] write failed: {e}")
+
+    def write(self, t: Turn):
+        meta = zlib.compress(json.dumps(t.meta, ensure_ascii=False).encode())
+        rec = _HDR.pack(MAGIC, len(meta), len(t.audio)) + meta + t.audio
+        fh = self._segment(len(rec))
+        fh.write(rec)
+        fh.flush()
+
+    def _segment(self, size: int):
+        limit = self.cfg["segment_mb"] * 1024 * 1024
+        if self.fh and self.fh.tell() + size <= limit:
+            return self.fh
+        if self.fh:
+            self.fh.close()
+        os.makedirs(self.cfg["dir"], exist_ok=True)
+        segs = segments(self.cfg["dir"])
+        nxt = int(os.path.basename(segs[-1])[4:10]) + 1 if segs else 1
+        for old in segs[:max(0, len(segs) + 1 - self.cfg["keep"])]:
+            os.unlink(old)
+        self.fh = open(os.path.join(self.cfg["dir"], f"seg-{nxt:06d}.vtr"), "ab")
+        return self.fh
+
+def segments(path: str) -> list[str]:
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "seg-*.vtr")))
+
+def read(path: str) -> Iterator[tuple[dict, bytes]]:
+    for seg in segments(path):
+        with open(seg, "rb") as f:
+            while True:
+                hdr = f.read(_HDR.size)
+                if len(hdr) < _HDR.size:
+                    break
+                magic, mlen, alen = _HDR.unpack(hdr)
+                if magic != MAGIC:
+                    raise ValueError(f"{seg}: bad record at offset {f.tell() - _HDR.size}")
+                raw = f.read(mlen)
+                audio = f.read(alen)
+                if len(raw) < mlen or len(audio) < alen:
+                    break  # torn tail from an interrupted write
+                yield json.loads(zlib.decompress(raw)), audio
+
+recorder = Recorder()
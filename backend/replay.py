@@ -0,0 +1,151 @@
+"""Re-drive recorded turns against this build with Gemini and TTS faked from the log.
+
+    python replay.py traces/ [--latency] [--out report.json] [--against old.json]
+
+Whisper runs for real, so STT timings reflect this build. Gemini answers
+come from the recorded calls, matched by prompt and falling back to
+recorded order when a prompt changed. TTS returns silence of the recorded
+size. --latency replays the recorded upstream latencies as well.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+
+import recorder
+from config import TRACE
+from services import whisper, gemini, tts
+from main import app
+
+class FakeGemini:
+    def __init__(self, delay: bool):
+        self.delay = delay
+        self.by_prompt: dict[str, list] = {}
+        self.queue: list = []
+        self.misses = 0
+
+    def load(self, meta: dict):
+        calls = [c for c in meta.get("calls", []) if not c.get("cached")]
+        self.queue = list(calls)
+        self.by_prompt = {}
+        for c in calls:
+            self.by_prompt.setdefault(c["prompt"], []).append(c)
+
+    def generate_content(self, prompt: str):
+        hits = self.by_prompt.get(prompt)
+        if hits:
+            c = hits.pop(0)
+            self.queue.remove(c)
+        elif self.queue:
+            self.misses += 1
+            c = self.queue.pop(0)
+        else:
+            self.misses += 1
+            c = {"resp": "", "ms": 0.0}
+        if self.delay:
+            time.sleep(c["ms"] / 1000)
+        return SimpleNamespace(text=c["resp"])
+
+def pct(vals: list[float], p: float) -> float:
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(len(vals) * p))], 1)
+
+def summarize(rows: list[dict]) -> dict:
+    out = {}
+    for name in sorted({k for r in rows for k in r}):
+        vals = [r[name] for r in rows if name in r]
+        out[name] = {"n": len(vals), "p50": pct(vals, 0.5), "p95": pct(vals, 0.95)}
+    return out
+
+async def run(args) -> dict:
+    fake = FakeGemini(args.latency)
+    gemini.model = fake
+    turn_meta = {}
+
+    async def fake_synth(text, lang="en", rate=1.0):
+        m = turn_meta["cur"]
+        if args.latency:
+            await asyncio.sleep(m["stages"].get("tts", 0) / 1000)
+        return b"\0" * m.get("tts_bytes", 0)
+    tts.synth = fake_synth
+
+    # Capture this build's stage timings in memory instead of on disk.
+    replayed = []
+    recorder.recorder.cfg = {**TRACE, "enabled": True, "sample": 1.0}
+    recorder.recorder.sink = lambda t: replayed.append(t.meta)
+
+    sids: dict[str, str] = {}
+    recorded, stt_diff = [], 0
+    turns = sorted(recorder.read(args.path), key=lambda x: x[0]["ts"])
+    # ASGITransport skips the lifespan; load models now so the first turn's stt is not a cold start.
+    if any(m["endpoint"] == "voice" for m, _ in turns):
+        whisper.init()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+        for meta, audio in turns:
+            turn_meta["cur"] = meta
+            fake.load(meta)
+            sid = sids.get(meta["sid"])
+            if meta["endpoint"] == "voice":
+                form = {"language": meta["lang"]}
+                if sid:
+                    form["session_id"] = sid
+                r = await client.post("/process-voice", data=form, files={"audio": ("clip.wav", audio, "audio/wav")})
+                new_sid = r.headers.get("X-Session-ID")
+            else:
+                body = {"text": meta.get("transcript", ""), "session_id": sid,
+                        "audio": meta.get("audio", False), "lang": meta["lang"]}
+                r = await client.post("/process-text", json=body)
+                new_sid = r.json().get("sid") if r.status_code == 200 else None
+            if new_sid:
+                sids[meta["sid"]] = new_sid
+            recorded.append(meta["stages"])
+            if replayed and meta["endpoint"] == "voice" and \
+                    replayed[-1].get("transcript", "").strip() != meta.get("transcript", "").strip():
+                stt_diff += 1
+
+    return {
+        "turns": len(turns),
+        "prompt_misses": fake.misses,
+        "transcript_changed": stt_diff,
+        "stt_tiers": dict(Counter(m["stt_tier"] for m in replayed if "stt_tier" in m)),
+        "recorded": summarize(recorded),
+        "replayed": summarize([m["stages"] for m in replayed])
+    }
+
+def show(report: dict, against: dict = None):
+    print(f"turns={report['turns']} prompt_misses={report['prompt_misses']} "
+          f"transcript_changed={report['transcript_changed']} stt_tiers={report.get('stt_tiers', {})}")
+    base = against["replayed"] if against else report["recorded"]
+    label = "against" if against else "recorded"
+    print(f"{'stage':<10} {label + ' p50':>14} {'p50':>9} {label + ' p95':>14} {'p95':>9}")
+    for name, cur in report["replayed"].items():
+        old = base.get(name, {"p50": 0.0, "p95": 0.0})
+        print(f"{name:<10} {old['p50']:>14} {cur['p50']:>9} {old['p95']:>14} {cur['p95']:>9}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path", help="segment file or trace directory")
+    ap.add_argument("--latency", action="store_true", help="replay recorded Gemini/TTS latency")
+    ap.add_argument("--out", help="write the report as JSON")
+    ap.add_argument("--against", help="previous report to compare with")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    against = None
+    if args.against:
+        with open(args.against) as f:
+            against = json.load(f)
+    show(report, against)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from config import BREAKERS, TURN_BUDGET_S
+
+turn_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)
+
+class Degraded(Exception):
+    pass
+
+class Breaker:
+    """Opens after `fails` consecutive failures, lets one probe through
+    after `reset_s`, and closes again on the first success."""
+
+    def __init__(self, name: str, fails: int, reset_s: float, timeout_s: float):
+        self.name = name
+        self.fails = fails
+        self.reset_s = reset_s
+        self.timeout_s = timeout_s
+        self.errs = 0
+        self.opened = 0.0
+        self.probing = False
+        self.ewma: dict[str, float] = {}
+
+    @property
+    def state(self) -> str:
+        if self.errs < self.fails:
+            return "closed"
+        if time.monotonic() - self.opened >= self.reset_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        st = self.state
+        if st == "closed":
+            return True
+        if st == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def ok(self, secs: float, kind: str = "all"):
+        self.errs = 0
+        self.probing = False
+        prev = self.ewma.get(kind)
+        self.ewma[kind] = secs if prev is None else 0.8 * prev + 0.2 * secs
+
+    def fail(self):
+        self.probing = False
+        self.errs += 1
+        if self.errs >= self.fails:
+            self.opened = time.monotonic()
+
+    def info(self) -> dict:
+        return {"state": self.state, "errors": self.errs,
+                "avg_ms": {k: round(v * 1000, 1) for k, v in self.ewma.items()}}
+
+breakers = {name: Breaker(name, **cfg) for name, cfg in BREAKERS.items()}
+degraded: Counter = Counter()
+
+def start_turn():
+    turn_deadline.set(time.monotonic() + TURN_BUDGET_S)
+
+def turn_left() -> Optional[float]:
+    d = turn_deadline.get()
+    return None if d is None else d - time.monotonic()
+
+def note(reason: str):
+    degraded[reason] += 1
+
+async def guard(name: str, call, kind: str = "all"):
+    # Latency is tracked per call kind so slow generations don't starve cheap ones.
+    br = breakers[name]
+    left = turn_left()
+    if left is not None and br.ewma.get(kind, 0.0) > left:
+        note(f"{name}_budget")
+        raise Degraded(name)
+    if not br.allow():
+        note(f"{name}_open")
+        raise Degraded(name)
+    timeout = br.timeout_s if left is None else min(br.timeout_s, left)
+    start = time.monotonic()
+    try:
+        res = await asyncio.wait_for(call(), timeout)
+    except asyncio.TimeoutError as e:
+        # Running out of turn budget is not the dependency's fault.
+        if timeout < br.timeout_s:
+            note(f"{name}_budget")
+        else:
+            br.fail()
+            note(f"{name}_error")
+        raise Degraded(name) from e
+    except Exception as e:
+        br.fail()
+        note(f"{name}_error")
+        raise Degraded(name) from e
+    finally:
+        # A cancelled or budget-cut probe must not leave the breaker stuck half-open.
+        br.probing = False
+    br.ok(time.monotonic() - start, kind)
+    return res
+
+def status() -> dict:
+    return {
+        "breakers": {name: br.info() for name, br in breakers.items()},
+        "degraded": dict(degraded)
+    }
@@ -0,0 +1,172 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from types import SimpleNamespace
+from typing import Optional
+
+from config import LLM_SCHED
+from resilience import turn_left, note
+
+current_sid: ContextVar[Optional[str]] = ContextVar("current_sid", default=None)
+
+class Lane(IntEnum):
+    INTERACTIVE = 0
+    USER = 1
+    BACKGROUND = 2
+
+class Overloaded(Exception):
+    pass
+
+class Bucket:
+    def __init__(self, rpm: float, burst: int):
+        self.rate = rpm / 60
+        self.cap = burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class Scheduler:
+    """Admits LLM calls by lane priority, per-session cap and a global
+    token bucket. Lanes shed when their queue is full or a waiter
+    exceeds its max wait."""
+
+    def __init__(self, cfg: dict = LLM_SCHED):
+        self.cfg = cfg
+        self.bucket = Bucket(cfg["rpm"], cfg["burst"])
+        self.heap: list = []
+        self.seq = itertools.count()
+        self.running = 0
+        self.per_sid: dict[str, int] = {}
+        self.timer = None
+        self.waits = [deque(maxlen=500) for _ in Lane]
+        self.queued = [0 for _ in Lane]
+        self.shed = [0 for _ in Lane]
+
+    def _free(self, sid) -> bool:
+        return self.running < self.cfg["concurrency"] and \
+            (sid is None or self.per_sid.get(sid, 0) < self.cfg["per_session"])
+
+    def _start(self, sid):
+        self.running += 1
+        if sid:
+            self.per_sid[sid] = self.per_sid.get(sid, 0) + 1
+
+    def _done(self, sid):
+        self.running -= 1
+        if sid:
+            self.per_sid[sid] -= 1
+            if not self.per_sid[sid]:
+                del self.per_sid[sid]
+        self._pump()
+
+    def _pump(self):
+        skipped = []
+        while self.heap and self.running < self.cfg["concurrency"]:
+            item = heapq.heappop(self.heap)
+            lane, _, sid, fut = item
+            if fut.done():
+                continue
+            if not self._free(sid):
+                skipped.append(item)
+                continue
+            if not self.bucket.take():
+                skipped.append(item)
+                if not self.timer:
+                    loop = asyncio.get_running_loop()
+                    self.timer = loop.call_later(self.bucket.wait(), self._tick)
+                break
+            self.queued[lane] -= 1
+            self._start(sid)
+            fut.set_result(True)
+        for item in skipped:
+            heapq.heappush(self.heap, item)
+
+    def _tick(self):
+        self.timer = None
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(self, lane: Lane = Lane.USER, sid: Optional[str] = None):
+        start = time.perf_counter()
+        if not any(x[0] <= lane for x in self.heap) and self._free(sid) and self.bucket.take():
+            self._start(sid)
+        else:
+            if self.queued[lane] >= self.cfg["queue_max"][lane]:
+                self.shed[lane] += 1
+                raise Overloaded(f"llm lane {lane.name.lower()} full")
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.heap, (lane, next(self.seq), sid, fut))
+            self.queued[lane] += 1
+            self._pump()
+            wait = self.cfg["max_wait"][lane]
+            left = turn_left()
+            if left is not None:
+                wait = max(0.0, min(wait, left))
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), wait)
+            except asyncio.TimeoutError:
+                if not fut.done():
+                    fut.cancel()
+                    self.queued[lane] -= 1
+                    self.shed[lane] += 1
+                    if wait < self.cfg["max_wait"][lane]:
+                        note("llm_budget")
+                        raise Overloaded(f"llm lane {lane.name.lower()} out of turn budget")
+                    raise Overloaded(f"llm lane {lane.name.lower()} timed out")
+            except asyncio.CancelledError:
+                if fut.done():
+                    self._done(sid)
+                else:
+                    fut.cancel()
+                    self.queued[lane] -= 1
+                raise
+        self.waits[lane].append((time.perf_counter() - start) * 1000)
+        # Callers put their executor future on lease.fut; the slot stays taken
+        # until that work really ends, even if the caller gave up on it.
+        lease = SimpleNamespace(fut=None)
+        try:
+            yield lease
+        finally:
+            if lease.fut is not None and not lease.fut.done():
+                lease.fut.add_done_callback(lambda f: self._settle(f, sid))
+            else:
+                self._done(sid)
+
+    def _settle(self, fut, sid):
+        if not fut.cancelled():
+            fut.exception()  # mark retrieved; the caller already moved on
+        self._done(sid)
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane in Lane:
+            w = sorted(self.waits[lane])
+            lanes[lane.name.lower()] = {
+                "queued": self.queued[lane],
+                "shed": self.shed[lane],
+                "wait_p50_ms": round(w[len(w) // 2], 1) if w else 0.0,
+                "wait_p95_ms": round(w[min(len(w) - 1, int(len(w) * 0.95))], 1) if w else 0.0
+            }
+        return {"running": self.running, "tokens": round(self.bucket.tokens, 1), "lanes": lanes}
+
+scheduler = Scheduler()
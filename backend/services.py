@@ -3,68 +3,196 @@ import re
 import json
 import asyncio
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import edge_tts
 import google.generativeai as genai
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
 
-from config import GEMINI_KEY, VOICES
+from collections import Counter, OrderedDict
+
+from config import GEMINI_KEY, VOICES, MSG, INTENT_WORDS, STT_TIERS, STT_CTRL, LLM_SCHED
 from models import Intent
-from prompts import INTENT_PROMPT
+from prompts import intent_prompt
+from budget import count, prompt_stats
+from scheduler import scheduler, current_sid, Lane, Overloaded
+from resilience import guard, note, Degraded, turn_left
+import recorder
+
+class TierCtl:
+    """Picks a Whisper tier per clip from in-flight depth, clip length and
+    language, with a hysteresis band and hold time on the load state."""
+
+    def __init__(self, tiers: dict = STT_TIERS, cfg: dict = STT_CTRL):
+        self.tiers = tiers
+        self.cfg = cfg
+        self.depth = 0
+        self.busy = False
+        self.changed = 0.0
+        self.picks: Counter = Counter()
+        self.rtf = {name: t["rtf"] for name, t in tiers.items()}
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if time.monotonic() - self.changed < self.cfg["hold_s"]:
+            return
+        if not self.busy and self.depth >= self.cfg["high_depth"]:
+            self.busy, self.changed = True, time.monotonic()
+        elif self.busy and self.depth <= self.cfg["low_depth"]:
+            self.busy, self.changed = False, time.monotonic()
+
+    def _have(self, name: str) -> str:
+        return name if name in self.tiers else self.cfg["default"]
+
+    def pick(self, clip_s: float, lang: str, left: float = None) -> str:
+        with self.lock:
+            self._load()
+            acc = self._have(self.cfg["accurate"])
+            if self.busy:
+                tier = self._have(self.cfg["busy"])
+            elif lang in self.cfg["accurate_langs"] and clip_s <= self.cfg["long_clip_s"] \
+                    and self.depth <= self.cfg["low_depth"] \
+                    and (left is None or clip_s * self.rtf[acc] <= left):
+                tier = acc
+            else:
+                tier = self.cfg["default"]
+            self.picks[tier] += 1
+            return tier
+
+    def observe(self, tier: str, clip_s: float, secs: float):
+        if clip_s > 0:
+            with self.lock:
+                self.rtf[tier] = 0.8 * self.rtf[tier] + 0.2 * secs / clip_s
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"depth": self.depth, "busy": self.busy, "picks": dict(self.picks),
+                    "rtf": {k: round(v, 3) for k, v in self.rtf.items()}}
 
 class Whisper:
     def __init__(self):
-        self.model = None
+        self.models: dict[str, WhisperModel] = {}
+        self.ctl = TierCtl()
 
-    def init(self):
-        if not self.model:
-            print("[whisper] loading...")
-            self.model = WhisperModel("turbo", device="cpu", compute_type="int8", num_workers=4)
-            print("[whisper] ready")
-
-    def _transcribe(self, path, lang):
-        segs, _ = self.model.transcribe(
-            path, beam_size=1, best_of=1, vad_filter=True,
-            vad_parameters=dict(min_silence_duration_ms=500),
+    @property
+    def model(self):
+        return self.models.get(STT_CTRL["default"])
+
+    def init(self, tiers: list[str] = None):
+        if tiers is None:
+            if STT_CTRL["default"] not in STT_TIERS:
+                raise ValueError(f"STT_CTRL default tier {STT_CTRL['default']!r} is not in STT_TIERS")
+            tiers = list(STT_TIERS)
+        for name in tiers:
+            t = STT_TIERS[name]
+            if name not in self.models:
+                print(f"[whisper] loading {name} ({t['model']}, {t['compute']})...")
+                self.models[name] = WhisperModel(t["model"], device="cpu", compute_type=t["compute"], num_workers=4)
+        print("[whisper] ready")
+
+    def _transcribe(self, audio, lang, tier):
+        t = STT_TIERS[tier]
+        segs, _ = self.models[tier].transcribe(
+            audio, beam_size=t["beam"], best_of=1, vad_filter=True,
+            vad_parameters=dict(min_silence_duration_ms=t["vad_ms"]),
             language=lang, condition_on_previous_text=False,
             no_speech_threshold=0.6
         )
         return " ".join(s.text for s in segs).strip()
 
-    async def transcribe(self, audio: bytes, lang: str = "en") -> str:
-        if not self.model:
+    def _run(self, path, lang, left):
+        audio = decode_audio(path, sampling_rate=16000)
+        clip_s = len(audio) / 16000
+        tier = self.ctl.pick(clip_s, lang, left)
+        start = time.perf_counter()
+        text = self._transcribe(audio, lang, tier)
+        self.ctl.observe(tier, clip_s, time.perf_counter() - start)
+        return text, tier
+
+    async def transcribe(self, audio: bytes, lang: str = "en") -> tuple[str, str]:
+        if not self.models:
             self.init()
         
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
             f.write(audio)
             path = f.name
         
+        self.ctl.depth += 1
         try:
             loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self._transcribe, path, lang)
+            # Executor threads don't see the turn's context, so read the budget here.
+            return await loop.run_in_executor(None, self._run, path, lang, turn_left())
         finally:
+            self.ctl.depth -= 1
             if os.path.exists(path):
                 os.unlink(path)
 
 class Gemini:
-    def __init__(self):
+    def __init__(self, cache_size: int = 256):
         self.model = None
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        self.cache_size = cache_size
+        # Own pool so Gemini never competes with Whisper for the default executor,
+        # and calls abandoned on timeout can only tie up these threads.
+        self.pool = ThreadPoolExecutor(max_workers=LLM_SCHED["concurrency"], thread_name_prefix="gemini")
 
     def init(self):
         if not self.model:
             genai.configure(api_key=GEMINI_KEY)
             self.model = genai.GenerativeModel('gemini-2.0-flash')
 
-    async def gen(self, prompt: str) -> str:
+    async def gen(self, prompt: str, kind: str = "other", lane: Lane = None, key: str = None) -> str:
+        # Fallback cache; key on stable inputs since prompts carry recent conversation.
+        key = key or prompt
         if not self.model:
             self.init()
+        if lane is None:
+            lane = Lane.INTERACTIVE if kind == "intent" else Lane.USER
         loop = asyncio.get_event_loop()
-        resp = await loop.run_in_executor(None, lambda: self.model.generate_content(prompt))
+        try:
+            async with scheduler.slot(lane, current_sid.get()) as lease:
+                def call():
+                    # The pool has one thread per slot, so this never queues; shield
+                    # keeps the future alive past a timeout so the slot outlives it.
+                    lease.fut = loop.run_in_executor(self.pool, lambda: self.model.generate_content(prompt))
+                    return asyncio.shield(lease.fut)
+                start = time.perf_counter()
+                resp = await guard("gemini", call, kind)
+        except (Degraded, Overloaded) as e:
+            if key in self.cache:
+                note("gemini_cached")
+                recorder.call(kind, prompt, self.cache[key], 0.0, cached=True)
+                return self.cache[key]
+            raise Degraded("gemini") from e
+        ms = (time.perf_counter() - start) * 1000
+        prompt_stats.record(kind, count(prompt), ms)
+        recorder.call(kind, prompt, resp.text, ms)
+        self.cache[key] = resp.text
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
         return resp.text
 
-    async def detect_intent(self, text: str, lang: str = "en") -> tuple[Intent, str | None, float]:
-        prompt = INTENT_PROMPT[lang].format(user_input=text)
+    @staticmethod
+    def local_intent(text: str, lang: str = "en") -> tuple[Intent, str | None, float]:
+        t = text.lower().strip()
+        for name, words in INTENT_WORDS.get(lang, INTENT_WORDS["en"]):
+            if any(re.search(rf"\b{re.escape(w)}\b", t) for w in words):
+                topic = None
+                if name == "learn":
+                    m = re.search(r"(?:about|teach me|explain|learn)\s+(?:about\s+)?(.+)", t) if lang == "en" \
+                        else re.search(r"(?:mənə\s+)?(.+?)\s+(?:haqqında|öyrət|izah et)", t)
+                    topic = m.group(1).strip(" .?!") if m else None
+                return Intent(name), topic, 0.3
+        if t.endswith("?"):
+            return Intent.QUESTION, None, 0.3
+        return Intent.UNKNOWN, None, 0.0
+
+    async def detect_intent(self, text: str, lang: str = "en", lane: Lane = Lane.INTERACTIVE) -> tuple[Intent, str | None, float]:
+        prompt = intent_prompt(text, lang)
         try:
-            resp = await self.gen(prompt)
+            resp = await self.gen(prompt, "intent", lane)
             cleaned = resp.strip()
             for pfx in ["```json", "```", "json"]:
                 cleaned = cleaned.removeprefix(pfx)
@@ -83,9 +211,21 @@ class Gemini:
             }
             return mapping.get(intent_str, Intent.UNKNOWN), topic, conf
         except:
-            return Intent.UNKNOWN, None, 0.0
+            note("intent_local")
+            return self.local_intent(text, lang)
 
 class TTS:
+    def __init__(self):
+        self.canned: dict[tuple[str, str], bytes] = {}
+
+    async def prerender(self, keys=("error", "no_audio", "busy")):
+        for lang in MSG:
+            for key in keys:
+                try:
+                    self.canned[(lang, key)] = await self.synth(MSG[lang][key], lang, 1.0)
+                except Degraded:
+                    print(f"[tts] could not prerender {lang}/{key}")
+
     @staticmethod
     def clean(text: str) -> str:
         text = re.sub(r'```[\s\S]*?```', '', text)
@@ -105,12 +245,14 @@ class TTS:
         voice = VOICES.get(lang, VOICES["en"])
         rate_str = f"+{int((rate-1)*100)}%" if rate >= 1 else f"{int((rate-1)*100)}%"
         
-        comm = edge_tts.Communicate(text, voice, rate=rate_str)
-        audio = b""
-        async for chunk in comm.stream():
-            if chunk["type"] == "audio":
-                audio += chunk["data"]
-        return audio
+        async def stream():
+            comm = edge_tts.Communicate(text, voice, rate=rate_str)
+            audio = b""
+            async for chunk in comm.stream():
+                if chunk["type"] == "audio":
+                    audio += chunk["data"]
+            return audio
+        return await guard("tts", stream)
 
 whisper = Whisper()
 gemini = Gemini()
@@ -0,0 +1,118 @@
+"""Word error rate and throughput of each Whisper tier on a sample set.
+
+    python stt_bench.py [--tiers fast turbo] [--workers 1 2 4] [--dir clips/] [--out report.json]
+
+Without --dir the bundled sentences in bench/stt_samples.json are spoken
+with edge-tts once and cached in bench/audio/. A --dir holds <name>.<ext>
+clips with a <name>.txt reference transcript; the language is taken from
+a "<lang>_" filename prefix (default en).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from faster_whisper import decode_audio
+
+from config import STT_TIERS
+from services import whisper, tts
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = os.path.join(HERE, "bench", "stt_samples.json")
+CACHE = os.path.join(HERE, "bench", "audio")
+
+def words(text: str) -> list[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def wer(ref: str, hyp: str) -> tuple[int, int]:
+    r, h = words(ref), words(hyp)
+    row = list(range(len(h) + 1))
+    for i, rw in enumerate(r, 1):
+        prev, row[0] = row[0], i
+        for j, hw in enumerate(h, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (rw != hw))
+    return row[-1], len(r)
+
+async def bundled() -> list[dict]:
+    with open(SAMPLES) as f:
+        items = json.load(f)
+    os.makedirs(CACHE, exist_ok=True)
+    for i, it in enumerate(items):
+        it["path"] = os.path.join(CACHE, f"{i:03d}_{it['lang']}.mp3")
+        if not os.path.exists(it["path"]):
+            with open(it["path"], "wb") as f:
+                f.write(await tts.synth(it["text"], it["lang"], 1.0))
+    return items
+
+def from_dir(path: str) -> list[dict]:
+    items = []
+    for ref in sorted(glob.glob(os.path.join(path, "*.txt"))):
+        stem = ref[:-4]
+        clips = [p for p in glob.glob(stem + ".*") if not p.endswith(".txt")]
+        if not clips:
+            continue
+        name = os.path.basename(stem)
+        lang = name.split("_", 1)[0] if "_" in name and name.split("_", 1)[0] in ("en", "az") else "en"
+        with open(ref) as f:
+            items.append({"lang": lang, "text": f.read().strip(), "path": clips[0]})
+    return items
+
+def run_tier(tier: str, items: list[dict], workers: int) -> dict:
+    def one(it):
+        start = time.perf_counter()
+        hyp = whisper._transcribe(it["audio"], it["lang"], tier)
+        return it, hyp, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as ex:
+        results = list(ex.map(one, items))
+    wall = time.perf_counter() - start
+
+    out = {"workers": workers, "wall_s": round(wall, 2),
+           "audio_per_s": round(sum(it["secs"] for it in items) / wall, 2), "langs": {}}
+    for lang in sorted({it["lang"] for it in items}):
+        errs = refs = 0
+        lat = []
+        for it, hyp, secs in results:
+            if it["lang"] == lang:
+                e, n = wer(it["text"], hyp)
+                errs, refs = errs + e, refs + n
+                lat.append(secs)
+        lat.sort()
+        out["langs"][lang] = {"wer": round(errs / max(refs, 1), 3),
+                              "p50_ms": round(lat[len(lat) // 2] * 1000, 1)}
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tiers", nargs="+", choices=list(STT_TIERS), default=list(STT_TIERS))
+    ap.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    ap.add_argument("--dir", help="directory of clips with .txt references")
+    ap.add_argument("--out", help="write the report as JSON")
+    args = ap.parse_args()
+
+    items = from_dir(args.dir) if args.dir else asyncio.run(bundled())
+    for it in items:
+        it["audio"] = decode_audio(it["path"], sampling_rate=16000)
+        it["secs"] = len(it["audio"]) / 16000
+    whisper.init(args.tiers)
+
+    report = {}
+    print(f"{'tier':<10} {'workers':>7} {'audio s/s':>10}  wer / p50 ms per language")
+    for tier in args.tiers:
+        report[tier] = []
+        for w in args.workers:
+            r = run_tier(tier, items, w)
+            report[tier].append(r)
+            langs = "  ".join(f"{l}: {v['wer']:.3f} / {v['p50_ms']}" for l, v in r["langs"].items())
+            print(f"{tier:<10} {w:>7} {r['audio_per_s']:>10}  {langs}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
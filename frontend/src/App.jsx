@@ -251,7 +251,7 @@ function App() {
         type: 'assistant',
         text: result.response,
         timestamp: new Date(),
-        hasAudio: true
+        hasAudio: !!result.audio
       };
       setMessages(prev => [...prev, assistantMessage]);
 
@@ -275,7 +275,9 @@ function App() {
 
       // Store audio and play it
       setCurrentAudioBlob(result.audio);
-      playAudio(result.audio);
+      if (result.audio) {
+        playAudio(result.audio);
+      }
 
     } catch (err) {
       console.error('Processing error:', err);
@@ -61,17 +61,19 @@ class VivaAPI {
     const responseText = decodeURIComponent(response.headers.get('X-Response-Text') || '');
     const mode = response.headers.get('X-Mode') || 'idle';
     const language = response.headers.get('X-Language') || this.language;
+    const audioPending = response.headers.get('X-Audio-Pending') === '1';
 
     // Save session
     if (sessionId) {
       this.saveSession(sessionId);
     }
 
-    // Get audio blob
-    const audioResponseBlob = await response.blob();
+    // Get audio blob (none when the server could not synthesize speech)
+    const audioResponseBlob = audioPending ? null : await response.blob();
 
     return {
       audio: audioResponseBlob,
+      audioPending,
       transcribed,
       response: responseText,
       mode,